@@ -6,12 +6,29 @@ It handles authentication and data retrieval for a user's troubled grammar point
 """
 
 from typing import Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
 from pydantic import BaseModel, Field
+import os
+import re
 import requests
-from bs4 import BeautifulSoup
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.etree
+import lxml.html
+import msgpack
+import orjson
 from bunpro_utils import parse_grammar_sections, fetch_grammar_details
 
+# The CSRF token is a single attribute on a single input tag, so a
+# compiled regex avoids a full HTML parse of the login page
+_TOKEN_RE = re.compile(rb'name="authenticity_token"\s+value="([^"]+)"')
+
+# Single compiled XPath for the login error alert; one tree walk
+# instead of chained container/alert lookups
+_LOGIN_ALERT_XP = lxml.etree.XPath(
+    '//div[contains(@class, "errors")]//div[contains(@class, "alert")]'
+)
+
 
 class BunproCredentials(BaseModel):
     """Pydantic model for Bunpro credentials"""
@@ -53,10 +70,97 @@ class BunproClient:
         """
         # Create a session to maintain cookies across requests
         self.session = requests.Session()
+        # Pool connections to bunpro.jp so detail fetches reuse warm
+        # TLS connections instead of re-handshaking, and retry on
+        # transient server errors with backoff
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=(502, 503, 504)
+            )
+        )
+        self.session.mount('https://', adapter)
+        # Advertise Brotli alongside gzip/deflate; detail pages are
+        # 50-200KB of HTML and compress 4-8x (requires the brotli package)
+        self.session.headers.update({
+            'User-Agent': 'bunpro-llm/1.0',
+            'Accept-Encoding': 'gzip, deflate, br'
+        })
         # Store credentials
         self.credentials = BunproCredentials(email=email, password=password)
         # Set the default data file path
         self.data_file = 'bunpro_data.json'
+        # Binary copy of the same data; msgpack parses faster than JSON
+        # on the app's load path while the JSON stays human-readable
+        self.msgpack_file = 'bunpro_data.msgpack'
+        # Append-only progress log for interrupted fetches
+        self.partial_file = self.data_file + '.partial'
+
+    def _post_login(self) -> requests.Response:
+        """
+        Fetch the login page, extract the CSRF token, and POST credentials.
+
+        Returns:
+            requests.Response: Response from the login POST
+        """
+        login_page_url = "https://bunpro.jp/users/sign_in"
+
+        # Get the login page first to obtain the CSRF token
+        response = self.session.get(login_page_url)
+        response.raise_for_status()
+
+        # Scan the raw bytes for the authentication token; fall
+        # back to a full parse if the markup ever changes shape
+        match = _TOKEN_RE.search(response.content)
+        if match:
+            authenticity_token = match.group(1).decode()
+        else:
+            tree = lxml.html.fromstring(response.text)
+            authenticity_token = tree.xpath('//input[@name="authenticity_token"]/@value')[0]
+
+        # Prepare login form data
+        login_data = {
+            "utf8": "✓",
+            "authenticity_token": authenticity_token,
+            "user[email]": self.credentials.email,
+            "user[password]": self.credentials.password,
+            "user[remember_me]": "1",
+            "commit": "Log in"
+        }
+
+        # Attempt to log in
+        return self.session.post(login_page_url, data=login_data)
+
+    def _check_login_response(self, login_response: requests.Response) -> tuple[bool, str]:
+        """
+        Inspect a login POST response for failure indicators.
+
+        Args:
+            login_response: Response from the login POST
+
+        Returns:
+            tuple[bool, str]: (success status, error message if any)
+        """
+        if login_response.status_code != 200:
+            return False, f"Login failed with status code: {login_response.status_code}"
+
+        # Cheap substring checks first: a successful login never
+        # contains these, so the full HTML parse only runs on the
+        # (rare) error path
+        body = login_response.text
+        if "Invalid Email or password." in body:
+            return False, "Invalid email or password. Please check your Bunpro credentials."
+
+        if 'class="errors"' in body:
+            # Something else went wrong; parse to confirm an alert is shown
+            alert_div = _LOGIN_ALERT_XP(lxml.html.fromstring(body))
+            if alert_div:
+                return False, f"Login failed: {alert_div[0].text_content().strip()}"
+
+        return True, ""
 
     def login(self) -> tuple[bool, str]:
         """
@@ -65,54 +169,56 @@ class BunproClient:
         Returns:
             tuple[bool, str]: (success status, error message if any)
         """
-        login_page_url = "https://bunpro.jp/users/sign_in"
-
         try:
-            # Get the login page first to obtain the CSRF token
-            response = self.session.get(login_page_url)
-            response.raise_for_status()
-
-            # Parse the page to find the authentication token
-            soup = BeautifulSoup(response.text, 'html.parser')
-            authenticity_token = soup.find('input', {'name': 'authenticity_token'})['value']
-
-            # Prepare login form data
-            login_data = {
-                "utf8": "✓",
-                "authenticity_token": authenticity_token,
-                "user[email]": self.credentials.email,
-                "user[password]": self.credentials.password,
-                "user[remember_me]": "1",
-                "commit": "Log in"
-            }
-
-            # Attempt to log in
-            login_response = self.session.post(login_page_url, data=login_data)
-            
-            # Parse response for error messages
-            error_soup = BeautifulSoup(login_response.text, 'html.parser')
-            
-            # Find the errors container and check for the alert message
-            errors_div = error_soup.find('div', {'class': 'errors'})
-            if errors_div:
-                alert_div = errors_div.find('div', {'class': 'alert'})
-                if alert_div and "Invalid Email or password." in alert_div.text:
-                    return False, "Invalid email or password. Please check your Bunpro credentials."
-            
-            if login_response.status_code != 200:
-                return False, f"Login failed with status code: {login_response.status_code}"
-            
-            return True, ""
+            return self._check_login_response(self._post_login())
 
         except requests.RequestException as e:
             return False, f"Connection error: {str(e)}"
         except Exception as e:
             return False, f"Unexpected error during login: {str(e)}"
 
-    def fetch_grammar_data(self) -> tuple[bool, str]:
+    def _load_previous_details(self) -> Dict[str, Dict]:
+        """
+        Load the previous run's grammar data indexed by link.
+
+        Returns:
+            Dict[str, Dict]: Mapping of grammar link to its stored data,
+                empty if no prior data file exists
+        """
+        by_link: Dict[str, Dict] = {}
+        try:
+            with open(self.data_file, 'rb') as f:
+                prev = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            prev = {}
+        for category in ('troubled_grammar', 'ghost_reviews'):
+            for item in prev.get(category, []):
+                if 'link' in item:
+                    by_link[item['link']] = item
+
+        # Recover items completed by an interrupted run
+        try:
+            with open(self.partial_file, 'rb') as f:
+                for line in f:
+                    try:
+                        item = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if 'link' in item:
+                        by_link.setdefault(item['link'], item)
+        except FileNotFoundError:
+            pass
+
+        return by_link
+
+    def fetch_grammar_data(self, stats_future: Optional[Future] = None) -> tuple[bool, str]:
         """
         Fetch and save grammar data from the user's profile.
 
+        Args:
+            stats_future: Optional in-flight request for the stats page,
+                used to overlap the fetch with the login check
+
         Returns:
             tuple[bool, str]: (success status, error message)
         """
@@ -120,8 +226,11 @@ class BunproClient:
         stats_url = "https://bunpro.jp/user/profile/stats"
 
         try:
-            # Fetch the stats page
-            stats_response = self.session.get(stats_url)
+            # Fetch the stats page (or collect the pre-dispatched request)
+            if stats_future is not None:
+                stats_response = stats_future.result()
+            else:
+                stats_response = self.session.get(stats_url)
             stats_response.raise_for_status()
             # Check if we're redirected to login page (session expired or not logged in)
             if "sign_in" in stats_response.url.lower():
@@ -131,13 +240,45 @@ class BunproClient:
                 # Parse the grammar sections from the response
                 result = parse_grammar_sections(stats_response.text)
                 base_url = "https://bunpro.jp"
-                
-                # Fetch detailed information for each grammar point
-                detailed_result = fetch_grammar_details(self.session, base_url, result)
 
-                # Save the results to a file
-                with open(self.data_file, 'w', encoding='utf-8') as f:
-                    json.dump(detailed_result, f, indent=2, ensure_ascii=False)
+                # Merge details from the previous run so only new grammar
+                # points need an HTTP fetch
+                prev_by_link = self._load_previous_details()
+                for category in ('troubled_grammar', 'ghost_reviews'):
+                    for item in result.get(category, []):
+                        prev = prev_by_link.get(item['link'])
+                        if prev and prev.get('structure'):
+                            item['structure'] = prev['structure']
+
+                # Fetch detailed information for each grammar point,
+                # logging each completed item for crash recovery
+                detailed_result = fetch_grammar_details(
+                    self.session, base_url, result, partial_file=self.partial_file
+                )
+
+                # Save the results atomically; orjson serializes at C
+                # speed and emits UTF-8 bytes directly, and os.replace
+                # prevents a half-written file on interruption
+                tmp_file = self.data_file + '.tmp'
+                with open(tmp_file, 'wb') as f:
+                    f.write(orjson.dumps(detailed_result, option=orjson.OPT_INDENT_2))
+                os.replace(tmp_file, self.data_file)
+
+                # Mirror the data as msgpack for the Streamlit app's
+                # faster binary load path; JSON remains the canonical,
+                # inspectable copy
+                tmp_file = self.msgpack_file + '.tmp'
+                with open(tmp_file, 'wb') as f:
+                    f.write(msgpack.packb(detailed_result))
+                os.replace(tmp_file, self.msgpack_file)
+
+                # Progress log is no longer needed once the canonical
+                # file is in place
+                try:
+                    os.remove(self.partial_file)
+                except FileNotFoundError:
+                    pass
+
                 return True, "Successfully fetched grammar data!"
             
             return False, f"Failed to fetch data: HTTP {stats_response.status_code}"
@@ -154,16 +295,32 @@ class BunproClient:
         Returns:
             tuple[bool, str]: (success status, error message if any)
         """
-        # First try to login
-        success, error_msg = self.login()
-        if not success:
-            return False, f"Login failed: {error_msg}"
-        
-        # Then try to fetch data
-        success, fetch_msg = self.fetch_grammar_data()
+        # Run the login POST first; any connection error here is fatal
+        try:
+            login_response = self._post_login()
+        except requests.RequestException as e:
+            return False, f"Login failed: Connection error: {str(e)}"
+        except Exception as e:
+            return False, f"Login failed: Unexpected error during login: {str(e)}"
+
+        # Dispatch the stats request immediately so its round trip
+        # overlaps with checking the login body we already have
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            stats_future = executor.submit(
+                self.session.get, "https://bunpro.jp/user/profile/stats"
+            )
+
+            success, error_msg = self._check_login_response(login_response)
+            if not success:
+                stats_future.cancel()
+                return False, f"Login failed: {error_msg}"
+
+            # Then try to fetch data using the in-flight stats request
+            success, fetch_msg = self.fetch_grammar_data(stats_future=stats_future)
+
         if not success:
             return False, fetch_msg
-        
+
         return True, "Successfully updated Bunpro data!"
 
 
@@ -5,54 +5,81 @@ This module provides utility functions for parsing and processing Bunpro grammar
 It includes functions for extracting grammar tiles, parsing grammar sections, and fetching detailed grammar information.
 """
 
-from typing import Dict, List, Any
-from bs4 import BeautifulSoup, Tag
+from typing import Dict, List, Any, Optional
+import asyncio
 import json
-import time
-from pydantic import BaseModel, Field
+import httpx
+import orjson
+import lxml.etree
+import lxml.html
+from selectolax.lexbor import LexborHTMLParser, LexborNode
 from requests import Session
 
+# XPath expressions for the detail-page parser, compiled once at import
+# so the per-page loop doesn't recompile them on every fetch
+_MAIN_XP = lxml.etree.XPath('//main')
+_STRUCTURE_XP = lxml.etree.XPath('.//div[@id="js-rev-header"]')
+_JAPANESE_XP = lxml.etree.XPath('string(.//span[contains(@class, "bp-ddw")])')
+_MEANING_XP = lxml.etree.XPath('string(.//span[contains(@class, "text-body")])')
+_TABLIST_XP = lxml.etree.XPath('.//ul[@role="tablist"]')
+_DETAILS_TAB_XP = lxml.etree.XPath('.//button[@role="tab"][@aria-controls="Details"]')
+_DETAILS_CONTENT_XP = lxml.etree.XPath('.//article[@data-location="show"]')
+_ABOUT_SECTION_XP = lxml.etree.XPath('.//section[.//header[@id="about"]]')
+_ABOUT_PROSE_XP = lxml.etree.XPath('.//div[contains(@class, "prose")]')
 
-class GrammarTile(BaseModel):
-    """Pydantic model for a grammar tile"""
-    link: str = Field(..., description="URL path to the grammar point")
-    text: str = Field(..., description="Grammar point text")
+# File used to persist ETag/Last-Modified validators between runs
+ETAG_CACHE_FILE = 'bunpro_etags.json'
 
 
-class GrammarStructure(BaseModel):
-    """Pydantic model for grammar structure"""
-    japanese: str = Field(..., description="Japanese grammar pattern")
-    meaning: str = Field(..., description="English meaning of the grammar")
+def load_etag_cache(cache_file: str = ETAG_CACHE_FILE) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the ETag/Last-Modified cache from disk.
+
+    Args:
+        cache_file (str): Path to the cache file
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Mapping of grammar link to cached validators and parsed data
+    """
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
 
+def save_etag_cache(cache: Dict[str, Dict[str, Any]], cache_file: str = ETAG_CACHE_FILE) -> None:
+    """
+    Persist the ETag/Last-Modified cache to disk.
 
-class GrammarData(BaseModel):
-    """Pydantic model for grammar data sections"""
-    troubled_grammar: List[GrammarTile] = Field(default_factory=list, description="List of troubled grammar points")
-    ghost_reviews: List[GrammarTile] = Field(default_factory=list, description="List of ghost review grammar points")
+    Args:
+        cache (Dict[str, Dict[str, Any]]): Mapping of grammar link to cached validators and parsed data
+        cache_file (str): Path to the cache file
+    """
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
 
 
-def extract_grammar_tiles(section: Tag) -> List[Dict[str, str]]:
+def extract_grammar_tiles(section: LexborNode) -> List[Dict[str, str]]:
     """
-    Extract grammar tiles from a BeautifulSoup section.
+    Extract grammar tiles from a parsed section node.
 
     Args:
-        section (Tag): BeautifulSoup Tag object containing grammar tiles
+        section (LexborNode): selectolax node containing grammar tiles
 
     Returns:
         List[Dict[str, str]]: List of dictionaries containing link and text for each grammar tile
     """
     # Find all div elements with the specified class
-    tiles = section.find_all("div", class_="user-profile-grammar-tile")
+    tiles = section.css("div.user-profile-grammar-tile")
     results = []
 
-    # Extract link and text from each tile
+    # Extract link and text from each tile; plain dicts here, validation
+    # happens at the BunproClient boundary rather than per row
     for tile in tiles:
-        link = tile.find("a")["href"]
-        text = tile.find("p").text
-        results.append(GrammarTile(
-            link=link,
-            text=text
-        ).model_dump())
+        link = tile.css_first("a").attributes.get("href")
+        text = tile.css_first("p").text()
+        results.append({"link": link, "text": text})
     return results
 
 
@@ -69,35 +96,195 @@ def parse_grammar_sections(html: str) -> Dict[str, List[Dict[str, str]]]:
     Raises:
         StopIteration: If required sections are not found
     """
-    # Parse HTML content
-    soup = BeautifulSoup(html, 'html.parser')
+    # Parse HTML content with the Lexbor engine
+    tree = LexborHTMLParser(html)
 
     # Find all sections with class "upro-wrapper_gp-tiles"
-    sections = soup.find_all("div", class_="upro-wrapper_gp-tiles")
+    sections = tree.css("div.upro-wrapper_gp-tiles")
+
+    # Map section headings to result keys so one pass over the
+    # sections handles both lookups and tile extraction
+    section_keys = {
+        "Troubled Grammar": "troubled_grammar",
+        "Ghost Reviews": "ghost_reviews",
+    }
+
+    # Initialize result sections
+    result = {"troubled_grammar": [], "ghost_reviews": []}
+    found = set()
+
+    for section in sections:
+        heading = section.css_first("p")
+        key = section_keys.get(heading.text()) if heading else None
+        if key:
+            result[key] = extract_grammar_tiles(section)
+            found.add(key)
+
+    if len(found) != len(section_keys):
+        print("Error: Could not find required grammar sections")
+        raise StopIteration("Could not find required grammar sections")
 
-    # Initialize result with Pydantic model
-    result = GrammarData().model_dump()
+    return result
 
-    try:
-        # Extract troubled grammar section
-        troubled_section = next(s for s in sections if s.find("p").text == "Troubled Grammar")
-        result["troubled_grammar"] = extract_grammar_tiles(troubled_section)
 
-        # Extract ghost reviews section
-        ghost_section = next(s for s in sections if s.find("p").text == "Ghost Reviews")
-        result["ghost_reviews"] = extract_grammar_tiles(ghost_section)
+def parse_grammar_point(html: str) -> Dict[str, Any]:
+    """
+    Parse a grammar point detail page into structured data.
 
-    except StopIteration as e:
-        print("Error: Could not find required grammar sections")
-        raise e
+    Args:
+        html (str): HTML content of a grammar point page
 
-    return result
+    Returns:
+        Dict[str, Any]: Parsed details (e.g. structure) for the grammar point
+    """
+    tree = lxml.html.fromstring(html)
+
+    # Find the main content section
+    main_content = _MAIN_XP(tree)
+    if not main_content:
+        return {}
+    main_content = main_content[0]
+
+    # Initialize parsed data dictionary
+    parsed_data = {}
+
+    # Extract structure information from header
+    structure_div = _STRUCTURE_XP(main_content)
+    if structure_div:
+        japanese = _JAPANESE_XP(structure_div[0]).strip()
+        meaning = _MEANING_XP(structure_div[0]).strip()
+        if japanese and meaning:
+            parsed_data['structure'] = {'japanese': japanese, 'meaning': meaning}
+
+    # Extract additional details from tabs
+    tab_list = _TABLIST_XP(main_content)
+    if tab_list:
+        details_tab = _DETAILS_TAB_XP(tab_list[0])
+        if details_tab:
+            details_content = _DETAILS_CONTENT_XP(main_content)
+            if details_content:
+                about_section = _ABOUT_SECTION_XP(details_content[0])
+                if about_section:
+                    about_content = _ABOUT_PROSE_XP(about_section[0])
+                    if about_content:
+                        # Commented out to avoid excessive data
+                        # parsed_data['about'] = ' '.join(about_content[0].itertext())
+                        pass
+
+    return parsed_data
+
+
+async def fetch_grammar_details_async(
+    cookies: Dict[str, str],
+    base_url: str,
+    grammar_data: Dict[str, List[Dict[str, str]]],
+    concurrency: int = 8,
+    partial_file: Optional[str] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetch and parse details for each grammar point concurrently.
+
+    Args:
+        cookies (Dict[str, str]): Authentication cookies from the logged-in session
+        base_url (str): Base URL for Bunpro website
+        grammar_data (Dict[str, List[Dict[str, str]]]): Dictionary containing grammar points to process
+        concurrency (int): Maximum number of in-flight requests
+        partial_file (Optional[str]): Append-only JSONL file recording each
+            completed item so interrupted runs keep partial progress
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Enhanced grammar data with additional details
+
+    Note:
+        A semaphore bounds concurrency to avoid overwhelming the server;
+        all requests multiplex over a single HTTP/2 connection
+    """
+    # Semaphore bounds how many requests are in flight at once
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Conditional-request cache: detail pages rarely change, so a 304
+    # lets us skip both the body download and the parse entirely
+    etag_cache = load_etag_cache()
+
+    # Append-only progress log so interrupted runs keep completed items
+    partial = open(partial_file, 'ab') if partial_file else None
+
+    # HTTP/2 multiplexes all detail requests over a handful of TLS
+    # connections instead of queueing them on HTTP/1.1
+    limits = httpx.Limits(max_connections=4, max_keepalive_connections=4)
+    async with httpx.AsyncClient(
+        http2=True,
+        cookies=cookies,
+        limits=limits,
+        timeout=10,
+        headers={'Accept-Encoding': 'gzip, deflate, br'}
+    ) as client:
+
+        async def fetch_one(item: Dict[str, Any]) -> None:
+            """Fetch and parse a single grammar point page."""
+            link = item['link']
+            full_url = base_url + link
+
+            # Send cached validators so unchanged pages answer 304
+            cached = etag_cache.get(link, {})
+            headers = {}
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+            async with semaphore:
+                response = await client.get(full_url, headers=headers)
+
+                # Only pace when the server signals throttling; the
+                # semaphore already bounds steady-state request rate
+                if response.status_code == 429:
+                    retry_after = float(response.headers.get('Retry-After', 1))
+                    await asyncio.sleep(retry_after)
+                    response = await client.get(full_url, headers=headers)
+
+                if response.status_code == 304:
+                    # Page unchanged: reuse the previously parsed data
+                    item.update(cached.get('parsed', {}))
+                elif response.status_code == 200:
+                    parsed = parse_grammar_point(response.text)
+                    item.update(parsed)
+                    etag_cache[link] = {
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'parsed': parsed,
+                    }
+
+                if partial is not None:
+                    # One compact line per completed item; an interrupted
+                    # run can recover everything written so far
+                    partial.write(orjson.dumps(item) + b"\n")
+
+        # Collect all items across categories and fetch them concurrently;
+        # items whose details were pre-merged from a previous run are skipped
+        items = [
+            item
+            for category in ['troubled_grammar', 'ghost_reviews']
+            for item in grammar_data.get(category, [])
+            if not item.get('structure')
+        ]
+        try:
+            await asyncio.gather(*(fetch_one(item) for item in items))
+        finally:
+            if partial is not None:
+                partial.close()
+
+    # Persist validators for the next run
+    save_etag_cache(etag_cache)
+
+    return grammar_data
 
 
 def fetch_grammar_details(
-    session: Session, 
-    base_url: str, 
-    grammar_data: Dict[str, List[Dict[str, str]]]
+    session: Session,
+    base_url: str,
+    grammar_data: Dict[str, List[Dict[str, str]]],
+    partial_file: Optional[str] = None
 ) -> Dict[str, List[Dict[str, Any]]]:
     """
     Fetch and parse details for each grammar point.
@@ -106,64 +293,17 @@ def fetch_grammar_details(
         session (Session): Active requests session with authentication
         base_url (str): Base URL for Bunpro website
         grammar_data (Dict[str, List[Dict[str, str]]]): Dictionary containing grammar points to process
+        partial_file (Optional[str]): Append-only JSONL progress file
 
     Returns:
         Dict[str, List[Dict[str, Any]]]: Enhanced grammar data with additional details
 
     Note:
-        Includes a delay between requests to avoid overwhelming the server
+        Synchronous wrapper around fetch_grammar_details_async so callers
+        keep the same signature; cookies are carried over from the session
     """
-    # Process each category of grammar points
-    for category in ['troubled_grammar', 'ghost_reviews']:
-        if category in grammar_data:
-            for item in grammar_data[category]:
-                # Construct full URL for the grammar point
-                full_url = base_url + item['link']
-                response = session.get(full_url)
-
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-
-                    # Find the main content section
-                    main_content = soup.find('main')
-                    if not main_content:
-                        continue
-
-                    # Initialize parsed data dictionary
-                    parsed_data = {}
-
-                    # Extract structure information from header
-                    structure_div = main_content.find('div', {'id': 'js-rev-header'})
-                    if structure_div:
-                        japanese = structure_div.find('span', {'class': 'bp-ddw'})
-                        meaning = structure_div.find('span', {'class': 'text-body'})
-                        if japanese and meaning:
-                            parsed_data['structure'] = GrammarStructure(
-                                japanese=japanese.get_text(strip=True),
-                                meaning=meaning.get_text(strip=True)
-                            ).model_dump()
-
-                    # Extract additional details from tabs
-                    tab_list = main_content.find('ul', {'role': 'tablist'})
-                    if tab_list:
-                        details_tab = tab_list.find('button', {'role': 'tab', 'aria-controls': 'Details'})
-                        if details_tab:
-                            details_content = main_content.find('article', {'data-location': 'show'})
-                            if details_content:
-                                about_header = details_content.find('header', {'id': 'about'})
-                                if about_header:
-                                    about_section = about_header.find_parent('section')
-                                    if about_section:
-                                        about_content = about_section.find('div', class_='prose')
-                                        if about_content:
-                                            # Commented out to avoid excessive data
-                                            # parsed_data['about'] = ' '.join(about_content.stripped_strings)
-                                            pass
-
-                    # Update item with parsed data
-                    item.update(parsed_data)
-
-                # Add delay to prevent server overload
-                time.sleep(0.1)
-
-    return grammar_data
\ No newline at end of file
+    # Reuse the authenticated session's cookies for the async client
+    cookies = session.cookies.get_dict()
+    return asyncio.run(
+        fetch_grammar_details_async(cookies, base_url, grammar_data, partial_file=partial_file)
+    )
\ No newline at end of file
@@ -7,10 +7,26 @@ Currently supports Groq's LLM API, with extensibility for additional LLM provide
 
 from typing import Optional, Literal, Dict, Any
 from pydantic import BaseModel, Field, SecretStr
-from groq import Groq
 import os
-from dotenv import load_dotenv
+import time
 from abc import ABC, abstractmethod
+import functools
+
+# groq (which pulls in httpx, anyio, ...) and dotenv are imported
+# lazily below: Streamlit re-imports this module on every rerun, and
+# module-level imports would charge that cost each time
+
+# load_dotenv does disk I/O and env parsing; only pay for it once per process
+_DOTENV_LOADED = False
+
+
+def _ensure_env_loaded() -> None:
+    """Load environment variables from .env exactly once per process."""
+    global _DOTENV_LOADED
+    if not _DOTENV_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _DOTENV_LOADED = True
 
 
 class LLMConfig(BaseModel):
@@ -44,6 +60,31 @@ class LLMConfig(BaseModel):
         gt=0,
         description="Maximum number of tokens to generate"
     )
+    max_connections: int = Field(
+        default=100,
+        gt=0,
+        description="Maximum HTTP connections in the provider's pool"
+    )
+    max_keepalive_connections: int = Field(
+        default=20,
+        gt=0,
+        description="Idle keep-alive connections retained in the pool"
+    )
+    keepalive_expiry: float = Field(
+        default=30.0,
+        ge=0.0,
+        description="Seconds an idle keep-alive connection stays open"
+    )
+    request_timeout: float = Field(
+        default=30.0,
+        gt=0.0,
+        description="Seconds to wait for the API before giving up on a request"
+    )
+    request_retries: int = Field(
+        default=2,
+        ge=0,
+        description="Retries (with backoff) for timed-out or failed connection attempts"
+    )
 
 
 class BaseLLMProvider(ABC):
@@ -59,24 +100,101 @@ class BaseLLMProvider(ABC):
         """Create a chat completion"""
         pass
 
+    async def create_chat_completion_async(self, messages: list, stream: bool = True) -> Any:
+        """Create a chat completion asynchronously (optional per provider)"""
+        raise NotImplementedError(f"{type(self).__name__} has no async client")
+
 
 class GroqProvider(BaseLLMProvider):
     """Groq LLM provider implementation"""
 
-    def initialize_client(self, config: LLMConfig) -> Groq:
-        """Initialize Groq client"""
+    def initialize_client(self, config: LLMConfig) -> "Groq":
+        """Initialize Groq client with a pooled keep-alive HTTP client"""
+        import httpx
+        from groq import Groq
+
         if not config.api_key.get_secret_value():
             raise ValueError("No Groq API key provided")
-        return Groq(api_key=config.api_key.get_secret_value())
+        # Keep-alive pooling lets sequential chat turns reuse a warm
+        # TLS connection to api.groq.com instead of re-handshaking.
+        # HTTP/2 multiplexes any concurrent requests over it, and
+        # Brotli/gzip cut the bytes streamed back for verbose responses
+        http_client = httpx.Client(
+            http2=True,
+            headers={'Accept-Encoding': 'br, gzip'},
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(connect=10.0, read=60.0, write=10.0, pool=5.0)
+        )
+        # These kwargs are identical on every call, so build the dict
+        # once here instead of per completion
+        self._base_kwargs = {
+            'model': config.model_name,
+            'temperature': config.temperature,
+            'max_tokens': config.max_tokens,
+            'timeout': config.request_timeout,
+        }
+        return Groq(
+            api_key=config.api_key.get_secret_value(),
+            http_client=http_client
+        )
+
+    def _get_async_client(self) -> "AsyncGroq":
+        """Lazily build the async Groq client on first use"""
+        import httpx
+        from groq import AsyncGroq
+
+        if getattr(self, '_async_client', None) is None:
+            self._async_client = AsyncGroq(
+                api_key=self.config.api_key.get_secret_value(),
+                http_client=httpx.AsyncClient(
+                    http2=True,
+                    headers={'Accept-Encoding': 'br, gzip'},
+                    limits=httpx.Limits(
+                        max_connections=self.config.max_connections,
+                        max_keepalive_connections=self.config.max_keepalive_connections,
+                        keepalive_expiry=self.config.keepalive_expiry
+                    ),
+                    timeout=httpx.Timeout(connect=10.0, read=60.0, write=10.0, pool=5.0)
+                )
+            )
+        return self._async_client
 
     def create_chat_completion(self, messages: list, stream: bool = True) -> Any:
-        """Create a chat completion using Groq"""
-        return self.client.chat.completions.create(
-            model=self.config.model_name,
+        """Create a chat completion using Groq.
+
+        A stalled request would otherwise hang the caller indefinitely;
+        the configured timeout cuts losses and timed-out/unreachable
+        attempts are retried with exponential backoff.
+        """
+        from groq import APIConnectionError, APITimeoutError
+
+        for attempt in range(self.config.request_retries + 1):
+            try:
+                return self.client.chat.completions.create(
+                    messages=messages,
+                    stream=stream,
+                    **self._base_kwargs
+                )
+            except (APITimeoutError, APIConnectionError):
+                if attempt == self.config.request_retries:
+                    raise
+                time.sleep(0.5 * (2 ** attempt))
+
+    async def create_chat_completion_async(self, messages: list, stream: bool = True) -> Any:
+        """Create a chat completion using the async Groq client.
+
+        Awaiting chunk arrival lets callers overlap network I/O with
+        other work (decoding, cache embedding, UI flushes) instead of
+        blocking the thread between tokens.
+        """
+        return await self._get_async_client().chat.completions.create(
             messages=messages,
-            temperature=self.config.temperature,
-            max_tokens=self.config.max_tokens,
-            stream=stream
+            stream=stream,
+            **self._base_kwargs
         )
 
 
@@ -122,7 +240,7 @@ class LLMClient:
                 If None, will attempt to load from environment variables.
         """
         # Load environment variables if not already loaded
-        load_dotenv()
+        _ensure_env_loaded()
 
         # Initialize configuration
         self.config = config or LLMConfig(
@@ -161,23 +279,31 @@ class LLMClient:
         """
         return self.provider.create_chat_completion(messages, stream)
 
+    async def create_chat_completion_async(self, messages: list, stream: bool = True) -> Any:
+        """
+        Create a chat completion asynchronously via the configured provider.
+
+        Args:
+            messages (list): List of message dictionaries
+            stream (bool): Whether to stream the response
+
+        Returns:
+            Awaitable response (async stream when stream=True)
+        """
+        return await self.provider.create_chat_completion_async(messages, stream)
+
 
-# Initialize default client
-default_config = LLMConfig(
-    provider="groq",
-    api_key=SecretStr(os.environ.get("GROQ_API_KEY", "")),
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7,
-    max_tokens=2048
-)
+@functools.lru_cache(maxsize=1)
+def get_default_client() -> LLMClient:
+    """
+    Build the default Groq-backed client from environment variables.
 
-try:
-    llm_client = LLMClient(default_config)
-    groq_client = llm_client.provider.client
-except ValueError as e:
-    print(f"Warning: Failed to initialize LLM client: {e}")
-    groq_client = None
+    Constructed lazily on first use so importing this module doesn't
+    open an HTTP client (Streamlit re-imports modules on every rerun).
+    """
+    _ensure_env_loaded()
+    return LLMClient()
 
 
-# Export the client for use in other modules
-__all__ = ['groq_client', 'LLMClient', 'LLMConfig', 'BaseLLMProvider']
\ No newline at end of file
+# Export the client factory for use in other modules
+__all__ = ['get_default_client', 'LLMClient', 'LLMConfig', 'BaseLLMProvider']
\ No newline at end of file
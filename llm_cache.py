@@ -0,0 +1,134 @@
+"""
+LLM Response Cache Module
+
+This module provides caching helpers for LLM chat completions, so repeated
+low-temperature requests can be answered without another API call.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+
+# Above this sampling temperature responses are not deterministic enough
+# to be worth caching
+CACHE_TEMPERATURE_THRESHOLD = 0.1
+
+
+def cache_key(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int
+) -> Optional[str]:
+    """
+    Build a cache key for a chat completion request.
+
+    Args:
+        model (str): Model identifier
+        messages (List[Dict[str, str]]): Full message list including the system prompt
+        temperature (float): Sampling temperature
+        max_tokens (int): Maximum tokens to generate
+
+    Returns:
+        Optional[str]: SHA256 hex digest of the request payload, or None
+            when the temperature is too high for caching to make sense
+    """
+    if temperature > CACHE_TEMPERATURE_THRESHOLD:
+        return None
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ExactMatchCache:
+    """
+    In-memory exact-match cache of completed responses.
+
+    Keys come from cache_key; values are the full response strings.
+    """
+
+    def __init__(self) -> None:
+        self._responses: Dict[str, str] = {}
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """Return the cached response for key, or None on miss."""
+        if key is None:
+            return None
+        return self._responses.get(key)
+
+    def set(self, key: Optional[str], response: str) -> None:
+        """Store a completed response under key (no-op when key is None)."""
+        if key is not None:
+            self._responses[key] = response
+
+
+class SemanticCache:
+    """
+    Near-duplicate prompt cache backed by sentence embeddings.
+
+    Questions like "Nの使い方は？" and "Nの用法教えて" yield the same tutor
+    answer but miss an exact-match cache. Prompts are embedded with a
+    small multilingual model and compared by cosine similarity; hits
+    above the threshold return the cached response.
+
+    Only standalone turns should be cached or matched — a prompt asked
+    mid-conversation can depend on context, so callers must restrict
+    lookups to turns with no prior history.
+
+    The sentence-transformers dependency is optional; without it the
+    cache silently disables itself.
+    """
+
+    MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+    def __init__(self, threshold: float = 0.92) -> None:
+        self.threshold = threshold
+        self._model = None
+        self._enabled: Optional[bool] = None
+        self._embeddings = None  # (n, dim) matrix of L2-normalized embeddings
+        self._entries: List[Tuple[str, str]] = []
+
+    def _ensure_model(self) -> bool:
+        """Lazily load the embedding model; disable the cache if unavailable."""
+        if self._enabled is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.MODEL_NAME)
+                self._enabled = True
+            except ImportError:
+                self._enabled = False
+        return self._enabled
+
+    def _embed(self, prompt: str):
+        """Return the L2-normalized embedding of prompt."""
+        return self._model.encode(prompt, normalize_embeddings=True)
+
+    def get(self, prompt: str) -> Optional[str]:
+        """Return the cached response for a near-duplicate prompt, or None."""
+        if not self._ensure_model() or self._embeddings is None:
+            return None
+        similarities = self._embeddings @ self._embed(prompt)
+        best = int(similarities.argmax())
+        if similarities[best] >= self.threshold:
+            return self._entries[best][1]
+        return None
+
+    def set(self, prompt: str, response: str) -> None:
+        """Store a prompt/response pair for future similarity lookups."""
+        if not self._ensure_model():
+            return
+        import numpy as np
+        embedding = self._embed(prompt).reshape(1, -1)
+        if self._embeddings is None:
+            self._embeddings = embedding
+        else:
+            self._embeddings = np.vstack([self._embeddings, embedding])
+        self._entries.append((prompt, response))
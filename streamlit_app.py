@@ -8,29 +8,24 @@ integrating Bunpro grammar data with LLM-powered responses.
 import streamlit as st
 from llm import LLMConfig, LLMClient
 import json
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - JSON fallback
+    msgpack = None
 from bunpro import BunproClient
-from typing import Dict, List, Union, Optional, Any
-from pydantic import BaseModel, Field, SecretStr
+from llm_cache import ExactMatchCache, SemanticCache, cache_key
+from typing import Dict, List, Optional
+from pydantic import SecretStr
 import os
-from groq import Groq  # Add this import for type hints
+import sys
+import threading
 import time
 
 
-class ChatMessage(BaseModel):
-    """Pydantic model for chat messages"""
-    role: str = Field(..., description="Role of the message sender (user/assistant/system)")
-    content: str = Field(..., description="Content of the message")
-
-
-class AppState(BaseModel):
-    """Pydantic model for application state"""
-    bunpro_credentials_set: bool = Field(default=False, description="Whether Bunpro credentials are set")
-    bunpro_data_loaded: bool = Field(default=False, description="Whether Bunpro data is loaded")
-    messages: List[ChatMessage] = Field(default_factory=list, description="Chat message history")
-    bunpro_email: Optional[str] = Field(None, description="Bunpro account email")
-    bunpro_password: Optional[str] = Field(None, description="Bunpro account password")
-
-
 # Set page config FIRST - before any other Streamlit commands
 st.set_page_config(
     page_title="Japanese Grammar Assistant",
@@ -39,52 +34,154 @@ st.set_page_config(
 )
 
 
-def decode_unicode(text: Union[str, Dict, List]) -> Union[str, Dict, List]:
-    """
-    Decode Unicode escape sequences in text.
-
-    Args:
-        text: Input text, dictionary, or list containing text to decode
+# Paths of the grammar data files written by BunproClient; the msgpack
+# mirror parses faster, the JSON copy is canonical
+BUNPRO_DATA_FILE = 'bunpro_data.json'
+BUNPRO_MSGPACK_FILE = 'bunpro_data.msgpack'
 
-    Returns:
-        Decoded text in the same structure as input
-    """
-    if isinstance(text, str):
-        return text.encode('utf-8').decode('unicode-escape').encode('latin1').decode('utf-8')
-    elif isinstance(text, dict):
-        return {k: decode_unicode(v) for k, v in text.items()}
-    elif isinstance(text, list):
-        return [decode_unicode(item) for item in text]
-    return text
+# Recent turns sent to the model each request. Sending the whole
+# transcript re-tokenizes O(turns²) text over a session; a grammar
+# question rarely depends on context older than this window
+MAX_HISTORY_TURNS = 10
 
 
-def load_bunpro_data() -> Optional[Dict]:
+@st.cache_data(show_spinner=False)
+def load_bunpro_data(mtime: Optional[float] = None) -> Optional[Dict]:
     """
     Load Bunpro grammar data from JSON file.
 
+    Args:
+        mtime: Modification time of the data file; cache key so the
+            file is only re-parsed after a refresh rewrites it
+
     Returns:
         Optional[Dict]: Dictionary containing grammar data or None if file not found
     """
+    # Prefer the binary mirror when it's current: msgpack unpacks the
+    # nested dict several times faster than JSON parsing
+    if msgpack is not None:
+        try:
+            if os.path.getmtime(BUNPRO_MSGPACK_FILE) >= os.path.getmtime(BUNPRO_DATA_FILE):
+                with open(BUNPRO_MSGPACK_FILE, 'rb') as f:
+                    return msgpack.unpackb(f.read(), raw=False)
+        except OSError:
+            pass
+
     try:
-        with open('bunpro_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(BUNPRO_DATA_FILE, 'rb') as f:
+            raw = f.read()
     except FileNotFoundError:
         return None
+    # orjson parses 2-3x faster than stdlib json when available
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# Static tutor instructions. Kept byte-identical across turns so the
+# always-first part of the prompt stays eligible for any server-side
+# prefix caching; the retrieved grammar points are appended per turn.
+# Interned so Streamlit's per-rerun re-import reuses one copy instead
+# of allocating the literal again
+SYSTEM_PROMPT_PREFIX = sys.intern(
+    """You are a Japanese language tutor helping a student with their Bunpro reviews.
+    - Use the grammar points listed below to help answer questions about Japanese grammar.
+    - You MUST use Japanese characters instead of Romaji
+    Grammar points from the student's reviews relevant to their question:
+    """
+)
+
+# Grammar points included per request. Shipping the full dump on every
+# call made time-to-first-token scale with the dataset; the prompt now
+# carries only the entries that match the question
+RETRIEVAL_TOP_K = 20
+
+
+def _char_bigrams(text: str) -> set:
+    """Character bigrams of text; works without word segmentation."""
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+@st.cache_data(show_spinner=False)
+def build_retrieval_index(mtime: float) -> List[tuple]:
+    """
+    Build the retrieval index over the Bunpro grammar data.
+
+    Each entry pairs the character bigrams of its searchable text with
+    a compact JSON rendering for the prompt. Character bigrams make
+    matching work on unsegmented Japanese as well as English queries.
+    Cached on the data file's mtime so the walk runs once per refresh.
+
+    Args:
+        mtime: Modification time of the data file; cache key
+
+    Returns:
+        List[tuple]: (bigram set, formatted entry) pairs
+    """
+    bunpro_data = load_bunpro_data(mtime)
+
+    index = []
+    for category in ("troubled_grammar", "ghost_reviews"):
+        for item in bunpro_data.get(category, []):
+            # Keep only the fields the tutor needs: internal links and
+            # other metadata just cost prompt tokens
+            entry = {
+                "grammar": item.get("text"),
+                **(item.get("structure") or {}),
+            }
+            if orjson is not None:
+                entry_json = orjson.dumps(
+                    entry, option=orjson.OPT_SORT_KEYS
+                ).decode('utf-8')
+            else:
+                entry_json = json.dumps(
+                    entry, ensure_ascii=False, sort_keys=True, separators=(',', ':')
+                )
+            searchable = ' '.join(str(v) for v in entry.values() if v)
+            index.append((_char_bigrams(searchable), entry_json))
+    return index
+
+
+def retrieve_grammar_context(prompt: str, mtime: float, k: int = RETRIEVAL_TOP_K) -> str:
+    """
+    Select the grammar points most relevant to the user's question.
+
+    Entries are scored by bigram overlap with the prompt and the top k
+    are returned, one JSON object per line. When nothing overlaps (e.g.
+    a greeting), the full list is sent rather than risk answering
+    without the relevant point.
+
+    Args:
+        prompt: The user's question
+        mtime: Modification time of the data file
+        k: Maximum number of grammar points to include
+
+    Returns:
+        str: Newline-joined JSON entries for the system prompt
+    """
+    index = build_retrieval_index(mtime)
+    query = _char_bigrams(prompt)
+    scored = sorted(
+        ((len(query & bigrams), entry_json) for bigrams, entry_json in index),
+        key=lambda pair: pair[0],
+        reverse=True,
+    )
+    matched = [entry_json for score, entry_json in scored[:k] if score > 0]
+    if matched:
+        return '\n'.join(matched)
+    return '\n'.join(entry_json for _, entry_json in index)
 
 
 def initialize_session_state() -> None:
     """Initialize Streamlit session state with default values"""
-    # Initialize session states using Pydantic model defaults
-    default_state = AppState()
-
     if 'bunpro_credentials_set' not in st.session_state:
-        st.session_state.bunpro_credentials_set = default_state.bunpro_credentials_set
+        st.session_state.bunpro_credentials_set = False
 
     if 'bunpro_data_loaded' not in st.session_state:
-        st.session_state.bunpro_data_loaded = default_state.bunpro_data_loaded
+        st.session_state.bunpro_data_loaded = False
 
     if "messages" not in st.session_state:
-        st.session_state.messages = default_state.messages
+        st.session_state.messages = []
 
     # Initialize LLM config with defaults if not set
     if 'llm_config' not in st.session_state:
@@ -96,106 +193,118 @@ def initialize_session_state() -> None:
         }
 
 
+@st.fragment
 def setup_sidebar() -> None:
-    """Setup and handle sidebar UI elements"""
-    with st.sidebar:
-        st.title('🤖💬 Japanese Grammar Assistant / 日本語文法アシスタント')
-
-        # LLM Settings section (always visible)
-        with st.expander("🔧 LLM Settings", expanded=True):
-            # Provider selection
-            provider = st.selectbox(
-                "Provider",
-                options=["groq", "openai", "anthropic"],
-                index=0,
-                help="Select your LLM provider"
-            )
+    """
+    Setup and handle sidebar UI elements.
+
+    Runs as a fragment so sidebar widget interactions rerun only this
+    function instead of the whole script. Streamlit forbids st.sidebar
+    inside a fragment body, so main() calls this inside a
+    `with st.sidebar:` block instead. Credential saves and resets still
+    call st.rerun(), which triggers a full-app rerun so the main flow
+    picks the changes up immediately; settings tweaked here are
+    otherwise read on the next full rerun (i.e. the next chat turn).
+    """
+    st.title('🤖💬 Japanese Grammar Assistant / 日本語文法アシスタント')
+
+    # LLM Settings section (always visible)
+    with st.expander("🔧 LLM Settings", expanded=True):
+        # Provider selection
+        provider = st.selectbox(
+            "Provider",
+            options=["groq", "openai", "anthropic"],
+            index=0,
+            help="Select your LLM provider"
+        )
 
-            # Show warning for non-Groq providers
-            if provider != "groq":
-                st.warning(f"⚠️ {provider.title()} integration is coming soon! Please use Groq for now.")
+        # Show warning for non-Groq providers
+        if provider != "groq":
+            st.warning(f"⚠️ {provider.title()} integration is coming soon! Please use Groq for now.")
 
-            # Model selection based on provider
-            if provider == "groq":
-                model_options = [
-                    "llama-3.3-70b-versatile",
-                    "mixtral-8x7b-32768"
-                ]
-            else:
-                model_options = ["Coming soon..."]
+        # Model selection based on provider
+        if provider == "groq":
+            model_options = [
+                "llama-3.3-70b-versatile",
+                "mixtral-8x7b-32768"
+            ]
+        else:
+            model_options = ["Coming soon..."]
 
-            model = st.selectbox(
-                "Model",
-                options=model_options,
-                index=0,
-                help="Select the model to use"
-            )
+        model = st.selectbox(
+            "Model",
+            options=model_options,
+            index=0,
+            help="Select the model to use"
+        )
 
-            # Temperature slider
-            temperature = st.slider(
-                "Temperature",
-                min_value=0.0,
-                max_value=1.0,
-                value=st.session_state.llm_config.get('temperature', 0.7),
-                step=0.1,
-                help="Higher values make output more creative, lower values more deterministic"
-            )
+        # Temperature slider
+        temperature = st.slider(
+            "Temperature",
+            min_value=0.0,
+            max_value=1.0,
+            value=st.session_state.llm_config.get('temperature', 0.7),
+            step=0.1,
+            help="Higher values make output more creative, lower values more deterministic"
+        )
 
-            # Max tokens slider
-            max_tokens = st.slider(
-                "Max Tokens",
-                min_value=256,
-                max_value=4096,
-                value=st.session_state.llm_config.get('max_tokens', 2048),
-                step=256,
-                help="Maximum length of the response"
-            )
+        # Max tokens slider
+        max_tokens = st.slider(
+            "Max Tokens",
+            min_value=256,
+            max_value=4096,
+            value=st.session_state.llm_config.get('max_tokens', 2048),
+            step=256,
+            help="Maximum length of the response"
+        )
 
-            # API Key input
-            api_key = st.text_input(
-                f"{provider.title()} API Key:", 
-                value=st.session_state.llm_config.get('api_key', ''),
-                type="password",
-                help=f"Enter your {provider.title()} API key"
-            )
+        # API Key input
+        api_key = st.text_input(
+            f"{provider.title()} API Key:",
+            value=st.session_state.llm_config.get('api_key', ''),
+            type="password",
+            help=f"Enter your {provider.title()} API key"
+        )
 
-            if api_key:  # Update config when API key is provided
-                st.session_state.llm_config.update({
-                    'provider': provider,
-                    'api_key': api_key,
-                    'model_name': model,
-                    'temperature': temperature,
-                    'max_tokens': max_tokens
-                })
-
-        # Bunpro credentials section
-        if not st.session_state.get('bunpro_credentials_set'):
-            with st.form("bunpro_credentials_form"):
-                st.subheader("Bunpro Credentials")
-                bunpro_email = st.text_input("Bunpro Email:", type="default")
-                bunpro_password = st.text_input("Bunpro Password:", type="password")
-
-                if st.form_submit_button("Save Bunpro Credentials"):
-                    if bunpro_email and bunpro_password:
-                        st.session_state.bunpro_email = bunpro_email
-                        st.session_state.bunpro_password = bunpro_password
-                        st.session_state.bunpro_credentials_set = True
-                        st.success("Bunpro credentials saved!")
-                        st.rerun()
-                    else:
-                        st.error("Please enter both email and password")
-
-        # Show refresh button if all credentials are set
-        if st.session_state.get('bunpro_credentials_set'):
-            handle_refresh_button()
-
-        # Add option to reset all credentials
-        if st.button("Reset All Credentials"):
-            for key in ['llm_config', 'bunpro_email', 'bunpro_password', 
-                      'credentials_set', 'bunpro_credentials_set']:
-                if key in st.session_state:
-                    del st.session_state[key]
-            st.rerun()
+        if api_key:  # Update config when API key is provided
+            st.session_state.llm_config.update({
+                'provider': provider,
+                'api_key': api_key,
+                'model_name': model,
+                'temperature': temperature,
+                'max_tokens': max_tokens
+            })
+
+    # Bunpro credentials section
+    if not st.session_state.get('bunpro_credentials_set'):
+        with st.form("bunpro_credentials_form"):
+            st.subheader("Bunpro Credentials")
+            bunpro_email = st.text_input("Bunpro Email:", type="default")
+            bunpro_password = st.text_input("Bunpro Password:", type="password")
+
+            if st.form_submit_button("Save Bunpro Credentials"):
+                if bunpro_email and bunpro_password:
+                    st.session_state.bunpro_email = bunpro_email
+                    st.session_state.bunpro_password = bunpro_password
+                    st.session_state.bunpro_credentials_set = True
+                    st.success("Bunpro credentials saved!")
+                    st.rerun()
+                else:
+                    st.error("Please enter both email and password")
+
+    # Show refresh button if all credentials are set
+    if st.session_state.get('bunpro_credentials_set'):
+        handle_refresh_button()
+
+    # Add option to reset all credentials
+    if st.button("Reset All Credentials"):
+        for key in ['llm_config', 'bunpro_email', 'bunpro_password',
+                  'credentials_set', 'bunpro_credentials_set']:
+            if key in st.session_state:
+                del st.session_state[key]
+        # Drop cached clients built from the old credentials
+        build_llm_client.clear()
+        st.rerun()
 
 
 def handle_refresh_button() -> None:
@@ -224,7 +333,33 @@ def handle_refresh_button() -> None:
                     st.error(f"Error: {message}")
 
 
-def initialize_llm_client() -> Optional[Any]:
+@st.cache_resource(show_spinner=False)
+def build_llm_client(
+    provider: str,
+    api_key: str,
+    model_name: str,
+    temperature: float,
+    max_tokens: int
+) -> LLMClient:
+    """
+    Build and cache the LLM client for the given settings.
+
+    Cached across reruns so a keystroke doesn't construct a fresh HTTP
+    client; the keep-alive pool survives between chat turns. Rebuilt
+    only when a setting actually changes, and cleared on credential
+    reset.
+    """
+    config = LLMConfig(
+        provider=provider,
+        api_key=SecretStr(api_key),
+        model_name=model_name,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+    return LLMClient(config)
+
+
+def initialize_llm_client() -> Optional[LLMClient]:
     """Initialize the LLM client with proper error handling."""
     try:
         if not st.session_state.get('llm_config'):
@@ -236,17 +371,14 @@ def initialize_llm_client() -> Optional[Any]:
             st.error("Please enter your API key in the LLM Settings.")
             return None
 
-        config = LLMConfig(
-            provider=st.session_state.llm_config['provider'],
-            api_key=SecretStr(st.session_state.llm_config['api_key']),
-            model_name=st.session_state.llm_config['model_name'],
-            temperature=st.session_state.llm_config['temperature'],
-            max_tokens=st.session_state.llm_config['max_tokens']
+        return build_llm_client(
+            st.session_state.llm_config['provider'],
+            st.session_state.llm_config['api_key'],
+            st.session_state.llm_config['model_name'],
+            st.session_state.llm_config['temperature'],
+            st.session_state.llm_config['max_tokens']
         )
 
-        client = LLMClient(config)
-        return client.provider.client
-
     except Exception as e:
         error_msg = str(e)
         if "'api_key'" in error_msg:
@@ -256,16 +388,61 @@ def initialize_llm_client() -> Optional[Any]:
         return None
 
 
-def handle_chat_interaction(system_prompt: str, llm_client: Optional[Any]) -> None:
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> ExactMatchCache:
+    """Shared exact-match response cache, persisted across reruns."""
+    return ExactMatchCache()
+
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache() -> SemanticCache:
+    """Shared semantic prompt cache, persisted across reruns."""
+    return SemanticCache()
+
+
+def prewarm_llm_connection(llm_client: LLMClient) -> None:
+    """
+    Open a TLS connection to the LLM provider before the first prompt.
+
+    A cheap models.list() call from a background thread leaves a warm
+    keep-alive connection in the pool, so the first user message skips
+    the TCP+TLS handshake. Runs once per session.
+    """
+    if st.session_state.get('llm_prewarmed'):
+        return
+    st.session_state.llm_prewarmed = True
+
+    def _ping() -> None:
+        try:
+            llm_client.provider.client.models.list()
+        except Exception:
+            # Best-effort warmup; real errors surface on the actual call
+            pass
+
+    threading.Thread(target=_ping, daemon=True).start()
+
+
+@st.fragment
+def render_history() -> None:
+    """
+    Render the chat transcript.
+
+    Scoped as a fragment so interactions elsewhere on the page (the
+    sidebar widgets in particular) don't replay every message; contents
+    are stored already decoded, so no per-message decode pass is needed.
+    """
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+def handle_chat_interaction(data_mtime: float, llm_client: Optional[LLMClient]) -> None:
     """Handle chat interactions with the LLM."""
     if llm_client is None:
         st.error("LLM client not initialized. Please check your configuration.")
         return
 
-    # Display chat history
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(decode_unicode(message["content"]))
+    render_history()
 
     # Handle new user input
     if prompt := st.chat_input("日本語の文法について質問してください..."):
@@ -277,25 +454,65 @@ def handle_chat_interaction(system_prompt: str, llm_client: Optional[Any]) -> No
 
             # Generate and display assistant response
             with st.chat_message("assistant"):
-                message_placeholder = st.empty()
-                full_response = ""
-
                 # Use current LLM settings from session state
                 config = st.session_state.llm_config
-                for response in llm_client.chat.completions.create(
-                    model=config['model_name'],
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        *[{"role": m["role"], "content": m["content"]}
-                          for m in st.session_state.messages]
-                    ],
-                    temperature=config['temperature'],
-                    max_tokens=config['max_tokens'],
-                    stream=True):
-                    chunk = response.choices[0].delta.content or ""
-                    full_response += chunk
-                    message_placeholder.markdown(decode_unicode(full_response + "▌"))
-                message_placeholder.markdown(decode_unicode(full_response))
+                # Static instructions plus only the grammar points that
+                # match this question; the stable prefix keeps any
+                # server-side prompt cache effective
+                system_prompt = SYSTEM_PROMPT_PREFIX + retrieve_grammar_context(
+                    prompt, data_mtime
+                )
+
+                # Only the most recent turns go to the API; the full
+                # transcript stays in session state for display. History
+                # entries are already {"role", "content"} dicts, so they
+                # go on the wire as-is instead of being re-copied
+                api_messages = [
+                    {"role": "system", "content": system_prompt},
+                    *st.session_state.messages[-MAX_HISTORY_TURNS * 2:]
+                ]
+
+                # At low temperatures identical requests produce
+                # identical answers, so repeats can skip the API call
+                response_cache = get_response_cache()
+                key = cache_key(
+                    config['model_name'], api_messages,
+                    config['temperature'], config['max_tokens']
+                )
+                cached_response = response_cache.get(key)
+
+                # Fall back to near-duplicate matching, but only for
+                # standalone turns: mid-conversation prompts can depend
+                # on context, where a similarity hit would be wrong
+                semantic_cache = get_semantic_cache()
+                is_standalone = len(st.session_state.messages) == 1
+                if cached_response is None and is_standalone:
+                    cached_response = semantic_cache.get(prompt)
+
+                if cached_response is not None:
+                    # Replay the cached answer in slices to keep the
+                    # streaming feel without any token cost
+                    def token_gen():
+                        for i in range(0, len(cached_response), 64):
+                            yield cached_response[i:i + 64]
+                            time.sleep(0.01)
+                else:
+                    # Groq streams plain UTF-8 text; no decoding needed
+                    def token_gen():
+                        for response in llm_client.create_chat_completion(
+                            api_messages, stream=True
+                        ):
+                            yield response.choices[0].delta.content or ""
+
+                # st.write_stream renders with Streamlit's own chunk
+                # coalescing (no per-token websocket round trips) and
+                # hands back the concatenated text
+                full_response = str(st.write_stream(token_gen))
+
+                if cached_response is None:
+                    response_cache.set(key, full_response)
+                    if is_standalone:
+                        semantic_cache.set(prompt, full_response)
 
             # Add assistant response to history
             st.session_state.messages.append(
@@ -311,8 +528,10 @@ def main():
     # Initialize session state first
     initialize_session_state()
 
-    # Setup sidebar (this will set credentials if needed)
-    setup_sidebar()
+    # Setup sidebar (this will set credentials if needed); the fragment
+    # must be invoked inside the sidebar context, not use st.sidebar itself
+    with st.sidebar:
+        setup_sidebar()
 
     # Initialize LLM client after sidebar setup
     llm_client = initialize_llm_client()
@@ -320,28 +539,24 @@ def main():
         st.error("Cannot proceed without LLM client. Please check your configuration.")
         st.stop()
 
+    # Open the TLS connection in the background while the user types
+    prewarm_llm_connection(llm_client)
+
     # Check credentials and load data
     if not st.session_state.bunpro_credentials_set:
         st.warning("Please set your Bunpro credentials in the sidebar first.")
         st.stop()
 
-    # Load and process Bunpro data
-    bunpro_data = load_bunpro_data()
-    if bunpro_data is None:
+    # Load and process Bunpro data; the mtime keys the caches so the
+    # JSON walk and retrieval index build run once per data refresh
+    try:
+        data_mtime = os.path.getmtime(BUNPRO_DATA_FILE)
+    except OSError:
         st.warning("No Bunpro data found. Please click 'Refresh Bunpro Data' to fetch the latest data.")
         st.stop()
 
-    # Decode Unicode in Bunpro data
-    bunpro_data = decode_unicode(bunpro_data)
-
-    # Create system prompt
-    system_prompt = f"""You are a Japanese language tutor with access to the following grammar points from Bunpro:
-    {json.dumps(bunpro_data, indent=2, ensure_ascii=False)}
-    - Use this information to help answer questions about Japanese grammar.
-    - You MUST use Japanese characters instead of Romaji"""
-
     # Handle chat interactions
-    handle_chat_interaction(system_prompt, llm_client)
+    handle_chat_interaction(data_mtime, llm_client)
 
 
 if __name__ == "__main__":